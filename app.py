@@ -1,56 +1,245 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import folium
-from folium.plugins import MarkerCluster
+from folium.plugins import FastMarkerCluster
+import duckdb
 import sqlite3
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime
-from streamlit_folium import st_folium
+import glob
+import hashlib
+import os
+import tempfile
 
 # --- Configuration ---
 st.set_page_config(layout="wide", page_title="Global UFO Sightings Tracker")
 
 # --- Helper Functions ---
+# Thin projection used by the filters, charts and map coordinates;
+# the bulky text columns are fetched by id only for the rows drawn on the map
+SIGHTING_COLUMNS = ['id', 'date', 'year', 'state', 'country', 'shape', 'latitude', 'longitude']
+DETAIL_COLUMNS = ['city', 'description']
+
+# Upper bound on the markers drawn on the map
+MAX_MAP_MARKERS = 10_000
+
+# Rendered maps are served from Streamlit's static folder (see .streamlit/config.toml)
+MAP_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+MAX_STATIC_MAPS = 64
+# Part of every map file name; bump it whenever create_map's output changes
+# (popup format, MARKER_CALLBACK, MAX_MAP_MARKERS, tiles) so old files are not reused
+MAP_RENDER_VERSION = 1
+
+# Leaflet callback turning a [lat, lon, popup, tooltip] row into a marker
+MARKER_CALLBACK = """\
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(row[2], {maxWidth: 300});
+    marker.bindTooltip(row[3]);
+    return marker;
+}"""
+
+def build_where(year_range, countries=(), states=(), shapes=(), keyword=''):
+    """Builds a parameterized WHERE clause from the sidebar filters."""
+    # The Parquet file is sorted by date, so DuckDB prunes row groups outside the year range
+    clauses = ["year BETWEEN ? AND ?"]
+    params = [year_range[0], year_range[1]]
+    for column, values in (('country', countries), ('state', states), ('shape', shapes)):
+        if values:
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    # Every word must appear; DuckDB's contains() is a native substring scan over the
+    # pre-lowercased column, with no regex engine involved
+    for term in keyword.lower().split():
+        clauses.append("contains(description_lc, ?)")
+        params.append(term)
+    return " WHERE " + " AND ".join(clauses), params
+
+def query_parquet(sql, params=(), parquet_path='ufo_sightings.parquet'):
+    """Runs a DuckDB query against the Parquet file, exposed as the `sightings` view."""
+    conn = duckdb.connect()
+    try:
+        conn.execute(f"CREATE VIEW sightings AS SELECT * FROM read_parquet('{parquet_path}')")
+        return conn.execute(sql, list(params)).to_arrow_table()
+    finally:
+        conn.close()
+
 @st.cache_data(ttl=3600) # Cache data for 1 hour
-def load_data(db_path='ufo_sightings.db'):
-    """Loads data from SQLite database."""
+def load_metadata():
+    """Loads the year bounds of the dataset."""
+    table = query_parquet("SELECT MIN(year) AS min_year, MAX(year) AS max_year FROM sightings")
+    return {'min_year': table['min_year'][0].as_py(), 'max_year': table['max_year'][0].as_py()}
+
+def distinct_values(column, year_range, countries=(), states=()):
+    """Loads the sorted distinct values of a column for the given filters from Parquet."""
+    where, params = build_where(year_range, countries, states)
+    table = query_parquet(
+        f"SELECT DISTINCT {column} FROM sightings{where} AND {column} IS NOT NULL ORDER BY {column}",
+        params
+    )
+    return table[column].to_pylist()
+
+def distinct_aggregate_values(table, column, year_range, db_path='ufo_sightings.db'):
+    """Loads the sorted distinct values of a column from a precomputed per-year table in SQLite."""
     conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query("SELECT * FROM sightings", conn)
+    rows = conn.execute(
+        f"SELECT DISTINCT {column} FROM {table} WHERE year BETWEEN ? AND ? ORDER BY {column}",
+        list(year_range)
+    ).fetchall()
     conn.close()
-    
-    df['datetime'] = pd.to_datetime(df['datetime'])
-    df['date'] = pd.to_datetime(df['date'])
-    df['year'] = df['date'].dt.year
+    return [row[0] for row in rows]
+
+# Filter option lists, cached on the upstream filters they depend on
+@st.cache_data(ttl=3600)
+def countries_for(year_range):
+    """Country options for a year range, read from the small per-year aggregate."""
+    return distinct_aggregate_values('agg_year_country', 'country', year_range)
+
+@st.cache_data(ttl=3600)
+def states_for(year_range, countries=()):
+    """State options for a year range and country selection."""
+    return distinct_values('state', year_range, countries)
+
+@st.cache_data(ttl=3600)
+def shapes_for(year_range, countries=(), states=()):
+    """Shape options; without a location filter they come from the per-year aggregate."""
+    if not countries and not states:
+        return distinct_aggregate_values('agg_year_shape', 'shape', year_range)
+    return distinct_values('shape', year_range, countries, states)
+
+# Shared across sessions without a pickle round trip; callers must not mutate the result
+@st.cache_resource(ttl=3600, max_entries=32)
+def load_filtered(year_range, countries=(), states=(), shapes=(), keyword=''):
+    """Loads only the sightings matching the filters, with projection and predicate pushdown."""
+    where, params = build_where(year_range, countries, states, shapes, keyword)
+    table = query_parquet(f"SELECT {', '.join(SIGHTING_COLUMNS)} FROM sightings{where}", params)
+    df = table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    # Parquet dictionary columns come back as plain strings; restore the categories
+    for column in ('country', 'state', 'shape'):
+        df[column] = df[column].astype('category')
     return df
 
+def load_descriptions(ids):
+    """Loads the city and description of the given sightings, indexed by id."""
+    table = query_parquet(
+        f"SELECT id, {', '.join(DETAIL_COLUMNS)} FROM sightings WHERE id IN (SELECT unnest(?::INTEGER[]))",
+        [[int(i) for i in ids]]
+    )
+    return table.to_pandas(types_mapper=pd.ArrowDtype).set_index('id')
+
 def create_map(filtered_df):
-    """Creates a Folium map with clustered markers."""
+    """Creates a Folium map with markers clustered in the browser."""
     m = folium.Map(location=[20, 0], zoom_start=2, tiles="CartoDB DarkMatter")
     
     if not filtered_df.empty:
-        marker_cluster = MarkerCluster().add_to(m)
-        for idx, row in filtered_df.iterrows():
-            if pd.notna(row['latitude']) and pd.notna(row['longitude']):
-                popup_html = f"""
-                <b>Date:</b> {row['date'].strftime('%Y-%m-%d')}<br>
-                <b>Location:</b> {row['city'].title() if pd.notna(row['city']) else 'N/A'}, {row['state'].upper() if pd.notna(row['state']) else 'N/A'}, {row['country'].upper() if pd.notna(row['country']) else 'N/A'}<br>
-                <b>Shape:</b> {row['shape'].title()}<br>
-                <b>Description:</b> {row['description'][:200]}...
-                """
-                folium.Marker(
-                    location=[row['latitude'], row['longitude']],
-                    popup=folium.Popup(popup_html, max_width=300),
-                    tooltip=f"{row['city'].title()}, {row['shape'].title()}"
-                ).add_to(marker_cluster)
+        lats = filtered_df['latitude'].to_numpy(dtype=float, na_value=np.nan)
+        lons = filtered_df['longitude'].to_numpy(dtype=float, na_value=np.nan)
+        sub = filtered_df.loc[~np.isnan(lats) & ~np.isnan(lons)]
+
+        # A map can't visually convey more points than this; a fixed seed keeps reruns identical
+        if len(sub) > MAX_MAP_MARKERS:
+            sub = sub.sample(n=MAX_MAP_MARKERS, random_state=0)
+        sub = sub.join(load_descriptions(sub['id']), on='id')
+
+        # Build popups/tooltips column-wise instead of per row
+        # String ops on categorical columns run once per category, then fill the gaps
+        city = sub['city'].fillna('N/A').str.title()
+        shape = sub['shape'].str.title().fillna('Unknown')
+        popups = (
+            "<b>Date:</b> " + sub['date'].dt.strftime('%Y-%m-%d') + "<br>"
+            + "<b>Location:</b> " + city + ", "
+            + sub['state'].str.upper().fillna('N/A') + ", "
+            + sub['country'].str.upper().fillna('N/A') + "<br>"
+            + "<b>Shape:</b> " + shape + "<br>"
+            + "<b>Description:</b> " + sub['description'].fillna('').str.slice(0, 200) + "..."
+        )
+        tips = city + ", " + shape
+
+        # Plain [lat, lon, popup, tooltip] rows; markers are created client-side by the callback.
+        # Coordinates are rounded to ~1 m so the float32 values serialize compactly.
+        data = list(zip(
+            sub['latitude'].to_numpy(dtype=float).round(5),
+            sub['longitude'].to_numpy(dtype=float).round(5),
+            popups.to_numpy(),
+            tips.to_numpy()
+        ))
+        FastMarkerCluster(data, callback=MARKER_CALLBACK).add_to(m)
     return m
 
+@st.cache_data(ttl=3600)
+def load_year_aggregates(year_range, db_path='ufo_sightings.db'):
+    """Sums the precomputed per-year counts in SQLite over the selected years."""
+    conn = sqlite3.connect(db_path)
+    params = list(year_range)
+    country_counts = pd.read_sql_query(
+        "SELECT country, SUM(n) AS n FROM agg_year_country WHERE year BETWEEN ? AND ? GROUP BY country ORDER BY n DESC",
+        conn, params=params
+    ).set_index('country')['n']
+    yearly_counts = pd.read_sql_query(
+        "SELECT year, n FROM agg_year WHERE year BETWEEN ? AND ? ORDER BY year",
+        conn, params=params
+    ).set_index('year')['n']
+    shape_counts = pd.read_sql_query(
+        "SELECT shape, SUM(n) AS n FROM agg_year_shape WHERE year BETWEEN ? AND ? GROUP BY shape ORDER BY n DESC",
+        conn, params=params
+    ).set_index('shape')['n']
+    conn.close()
+    return country_counts, yearly_counts, shape_counts
+
+def evict_static_maps():
+    """Deletes the least recently used map files beyond MAX_STATIC_MAPS."""
+    maps = []
+    for path in glob.glob(os.path.join(MAP_STATIC_DIR, 'map_*.html')):
+        try:
+            maps.append((os.path.getmtime(path), path))
+        except OSError: # Removed by another session in the meantime
+            pass
+    for _, path in sorted(maps, reverse=True)[MAX_STATIC_MAPS:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def static_map_url(year_range, countries=(), states=(), shapes=(), keyword='', parquet_path='ufo_sightings.parquet'):
+    """
+    Saves the map for a filter combination as a static file, once, and returns its URL.
+    The file name hashes the filters, the data file's timestamp and MAP_RENDER_VERSION,
+    so browsers can cache it across sessions and neither regenerated data nor a
+    changed map layout ever serves a stale map.
+    """
+    filters = (MAP_RENDER_VERSION, tuple(year_range), tuple(sorted(countries)), tuple(sorted(states)),
+               tuple(sorted(shapes)), tuple(keyword.lower().split()), os.path.getmtime(parquet_path))
+    key = hashlib.sha1(repr(filters).encode()).hexdigest()
+    filename = f"map_{key}.html"
+    path = os.path.join(MAP_STATIC_DIR, filename)
+
+    try:
+        os.utime(path) # Mark as recently used for eviction
+    except FileNotFoundError: # Not rendered yet, or evicted by another session
+        os.makedirs(MAP_STATIC_DIR, exist_ok=True)
+        # Write to a temporary name first so concurrent sessions never serve a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=MAP_STATIC_DIR, suffix='.tmp')
+        os.close(fd)
+        try:
+            create_map(load_filtered(year_range, countries, states, shapes, keyword)).save(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path): # Only left behind when rendering failed
+                os.remove(tmp_path)
+        evict_static_maps()
+
+    # Static files are mounted under the server's base URL path, if one is configured
+    base_path = st.get_option('server.baseUrlPath').strip('/')
+    return f"{'/' + base_path if base_path else ''}/app/static/{filename}"
+
 # --- Load Data ---
-df = load_data()
+metadata = load_metadata()
 
 # Get min/max years for slider
-min_year = int(df['year'].min())
-max_year = int(df['year'].max())
+min_year = metadata['min_year']
+max_year = metadata['max_year']
 
 # --- Streamlit UI ---
 st.title("👽 Global UFO Sightings Tracker")
@@ -65,31 +254,26 @@ year_range = st.sidebar.slider(
     max_value=max_year,
     value=(min_year, max_year)
 )
-filtered_df = df[(df['year'] >= year_range[0]) & (df['year'] <= year_range[1])]
 
 # Country Filter
-all_countries = sorted(filtered_df['country'].dropna().unique())
-selected_countries = st.sidebar.multiselect("Filter by Country", all_countries)
-if selected_countries:
-    filtered_df = filtered_df[filtered_df['country'].isin(selected_countries)]
-
-# State Filter (only if countries are selected or for US/Canada)
-if 'us' in filtered_df['country'].str.lower().unique() or 'ca' in filtered_df['country'].str.lower().unique() or selected_countries:
-    all_states = sorted(filtered_df['state'].dropna().unique())
-    selected_states = st.sidebar.multiselect("Filter by State (if applicable)", all_states)
-    if selected_states:
-        filtered_df = filtered_df[filtered_df['state'].isin(selected_states)]
+all_countries = countries_for(year_range)
+selected_countries = tuple(st.sidebar.multiselect("Filter by Country", all_countries))
+
+# State Filter (only if countries are selected or for US/Canada in the selected years)
+selected_states = ()
+if {'us', 'ca'} & {c.lower() for c in all_countries} or selected_countries:
+    all_states = states_for(year_range, selected_countries)
+    selected_states = tuple(st.sidebar.multiselect("Filter by State (if applicable)", all_states))
 
 # Shape Filter
-all_shapes = sorted(filtered_df['shape'].dropna().unique())
-selected_shapes = st.sidebar.multiselect("Filter by Shape", all_shapes)
-if selected_shapes:
-    filtered_df = filtered_df[filtered_df['shape'].isin(selected_shapes)]
+all_shapes = shapes_for(year_range, selected_countries, selected_states)
+selected_shapes = tuple(st.sidebar.multiselect("Filter by Shape", all_shapes))
 
 # Keyword Search
-keyword = st.sidebar.text_input("Search in Description (e.g., 'bright light')")
-if keyword:
-    filtered_df = filtered_df[filtered_df['description'].str.contains(keyword, case=False, na=False)]
+keyword = st.sidebar.text_input("Search in Description (all words must match, e.g., 'bright light')")
+
+# Only the matching rows are read from the database
+filtered_df = load_filtered(year_range, selected_countries, selected_states, selected_shapes, keyword)
 
 st.sidebar.markdown(f"**Total Sightings (Filtered):** {len(filtered_df):,}")
 
@@ -100,17 +284,27 @@ with col1:
     st.subheader("UFO Sightings Map")
     if not filtered_df.empty:
         # Generate and display map
-        m = create_map(filtered_df)
-        st_data = st_folium(m, width=900, height=600)
+        map_url = static_map_url(year_range, selected_countries, selected_states, selected_shapes, keyword)
+        st.iframe(map_url, height=600)
+        if len(filtered_df) > MAX_MAP_MARKERS:
+            st.caption(f"Showing a random sample of {MAX_MAP_MARKERS:,} of {len(filtered_df):,} sightings on the map.")
     else:
         st.warning("No sightings match the selected filters. Try adjusting your criteria.")
 
 with col2:
     st.subheader("Sightings Statistics")
 
+    # Year-only views use the precomputed aggregates; other filters need the filtered rows
+    if selected_countries or selected_states or selected_shapes or keyword:
+        country_counts = filtered_df['country'].value_counts()
+        yearly_counts = filtered_df['year'].value_counts().sort_index()
+        shape_counts = filtered_df['shape'].value_counts()
+    else:
+        country_counts, yearly_counts, shape_counts = load_year_aggregates(year_range)
+
     st.markdown("---")
     st.markdown("**Top 10 Countries by Sightings**")
-    country_counts = filtered_df['country'].value_counts().head(10)
+    country_counts = country_counts.head(10)
     if not country_counts.empty:
         fig_country = px.bar(
             country_counts,
@@ -128,7 +322,7 @@ with col2:
     st.markdown("---")
     st.markdown("**Sightings Timeline Trend**")
     # Group by year and count sightings
-    yearly_counts = filtered_df['year'].value_counts().sort_index().reset_index()
+    yearly_counts = yearly_counts.reset_index()
     yearly_counts.columns = ['Year', 'Count']
     if not yearly_counts.empty:
         fig_timeline = px.line(
@@ -144,7 +338,7 @@ with col2:
 
     st.markdown("---")
     st.markdown("**Top 10 Sighting Shapes**")
-    shape_counts = filtered_df['shape'].value_counts().head(10)
+    shape_counts = shape_counts.head(10)
     if not shape_counts.empty:
         fig_shape = px.bar(
             shape_counts,